@@ -1,17 +1,23 @@
 import sys
 import os
 import re
-from threading import Thread
+import mmap
+import glob
+import logging
+import platform
+import time
+from bisect import bisect_right
+from functools import lru_cache
+from threading import Lock, Event, Thread
 
 from PyQt6.QtWidgets import (
     QApplication, QMainWindow, QWidget,
     QHBoxLayout, QVBoxLayout,
-    QLabel, QTextEdit, QLineEdit, QPushButton,
-    QGraphicsDropShadowEffect
+    QLabel, QPlainTextEdit, QLineEdit, QPushButton
 )
 from PyQt6.QtGui import (
     QPalette, QColor, QPainter, QFont, QPixmap, QIcon,
-    QPainterPath, QPen, QConicalGradient, QBrush
+    QPainterPath, QPen, QConicalGradient, QBrush, QTextCursor
 )
 from PyQt6.QtCore import Qt, pyqtSignal, QObject, QTimer, QRectF, QPointF
 
@@ -30,8 +36,81 @@ try:
 except Exception:
     HAS_LLAMA = False
 
-MODEL_PATH = os.path.join(BASE_DIR, "models", "mistral.gguf")
+# есть ли в сборке llama.cpp CUDA/Metal (тогда слои уходят на видеокарту)
+try:
+    from llama_cpp import llama_supports_gpu_offload
+    HAS_GPU = bool(llama_supports_gpu_offload())
+except Exception:
+    HAS_GPU = False
+
+MODELS_DIR = os.path.join(BASE_DIR, "models")
+
+# Порядок поиска модели: сначала файлы с явной квантовкой в имени
+# (Q4_K_M / Q5_K_M) — они в разы меньше и быстрее на CPU, последним —
+# старое имя mistral.gguf (квантовка любая, обычно Q4_K_M из README).
+# Квантовать FP16-модель: llama-quantize model-f16.gguf mistral-q4_k_m.gguf Q4_K_M
+MODEL_FILES = [
+    "mistral-q4_k_m.gguf",
+    "mistral-q5_k_m.gguf",
+    "mistral.gguf",
+]
+if platform.machine().lower() in ("arm64", "aarch64"):
+    # на ARM (Neoverse, Apple M) llama.cpp сам перепаковывает Q4_0
+    # в чередующуюся раскладку (Q4_0_8_8) под быстрые ядра
+    MODEL_FILES.insert(0, "mistral-q4_0.gguf")
+
+# ggml_type для квантования KV-кэша (Q8_0 — вдвое меньше памяти)
+try:
+    from llama_cpp import GGML_TYPE_Q8_0
+except Exception:
+    GGML_TYPE_Q8_0 = 8
+
+
+def physical_cores() -> int | None:
+    """Число физических ядер по topology в sysfs (Linux), иначе None."""
+    siblings = set()
+    for path in glob.glob(
+        "/sys/devices/system/cpu/cpu[0-9]*/topology/thread_siblings_list"
+    ):
+        try:
+            with open(path, "r", encoding="ascii") as f:
+                siblings.add(f.read().strip())
+        except OSError:
+            return None
+    return len(siblings) or None
+
+
+# Потоки: генерация упирается в память, ей хватает физических ядер;
+# разбор промпта упирается в вычисления — ему отдаём все логические.
+# Если физические ядра узнать нельзя (Windows, macOS), не угадываем
+# Hyper-Threading: берём половину логических, но не меньше прежних 8.
+CPU_CORES = os.cpu_count() or 4
+N_THREADS = physical_cores() or min(CPU_CORES, max(8, CPU_CORES // 2))
+N_THREADS_BATCH = CPU_CORES
+
+# больше одного NUMA-узла (многопроцессорный Linux) — раскидываем по узлам
+HAS_NUMA = os.path.isdir("/sys/devices/system/node/node1")
+
 llm = None
+# контекст llama.cpp не потокобезопасен: загрузка и генерация — только под замком
+LLM_LOCK = Lock()
+# модель грузится в фоне (preload_llm)
+LLM_LOADING = Event()
+# идёт генерация ответа — второй запрос не ставим в очередь, а отклоняем
+# (замок берётся без ожидания: проверка и захват — одно атомарное действие)
+AI_BUSY = Lock()
+
+
+def find_model_path() -> str | None:
+    """Первая найденная модель из MODEL_FILES."""
+    for name in MODEL_FILES:
+        path = os.path.join(MODELS_DIR, name)
+        if os.path.exists(path):
+            return path
+    return None
+
+
+MODEL_PATH = find_model_path()
 
 
 def get_llm():
@@ -42,98 +121,238 @@ def get_llm():
     global llm
     if not HAS_LLAMA:
         return None
-    if not os.path.exists(MODEL_PATH):
+    if MODEL_PATH is None:
         return None
-    if llm is None:
-        try:
+    # модель грузится и из фонового preload_llm, и из AIWorker —
+    # без блокировки можно загрузить её дважды
+    # (AIWorker берёт LLM_LOCK только после get_llm — замок не повторный)
+    with LLM_LOCK:
+        if llm is None:
             os.environ["LLAMA_LOG_LEVEL"] = "ERROR"
-            llm = Llama(
+            base = dict(
                 model_path=MODEL_PATH,
                 n_ctx=4096,
-                n_threads=8,   # если ПК слабый — можно уменьшить до 4
+                n_threads=N_THREADS,
+                n_threads_batch=N_THREADS_BATCH,
                 n_batch=256,
+                numa=HAS_NUMA,
+                use_mmap=True,
+                use_mlock=True,   # веса не выгружаются в своп между вопросами
                 verbose=False
             )
-        except Exception:
-            return None
+            # flash attention нужен llama.cpp и для квантованного V-кэша
+            fast = dict(
+                base,
+                flash_attn=True,
+                type_k=GGML_TYPE_Q8_0,
+                type_v=GGML_TYPE_Q8_0
+            )
+            variants = [fast, base]
+            if HAS_GPU:
+                variants.insert(0, dict(
+                    fast,
+                    n_gpu_layers=-1,   # все слои на видеокарту
+                    main_gpu=0,
+                    offload_kqv=True
+                ))
+
+            # от самого быстрого варианта к самому простому:
+            # не хватило видеопамяти или сборка не умеет — пробуем следующий
+            for params in variants:
+                try:
+                    llm = Llama(**params)
+                    break
+                except Exception:
+                    continue
+
+            # сразу кладём инструкцию в KV-кэш — первый вопрос её уже не считает
+            if llm is not None:
+                try:
+                    llm.eval(llm.tokenize(PROMPT_HEAD.encode("utf-8")))
+                except Exception:
+                    llm.reset()
     return llm
 
 
 # ========= ИИ в отдельном потоке =========
-class AIWorker(QObject):
+# ПРОМПТ БЕЗ ТЕГОВ <ОТВЕТ>/<ВОПРОС>
+# Неизменная часть идёт первой: llama-cpp-python сам берёт из KV-кэша
+# общее начало с прошлым запросом, так что инструкция считается один раз,
+# а на каждый вопрос модель прогоняет только фрагмент закона и вопрос.
+# Инструкция нарочно короткая: каждый её токен модель считает при загрузке
+# и после сброса кэша, а на слабом CPU это и есть время до первого слова.
+PROMPT_HEAD = """
+Ты юридический помощник по законам РФ. Отвечай простым языком, по делу, \
+от первого лица и только по реальным законам РФ; если данных мало, так и \
+скажи и посоветуй официальные источники (Консультант+, pravo.gov.ru).
+
+Фрагмент закона (может быть пустым):
+"""
+
+PROMPT_TAIL = """{fragment}
+
+Вопрос пользователя:
+{question}
+
+Не повторяй вопрос и инструкцию.
+Ответ:
+"""
+
+# Явный мусор, которым модель иногда начинает ответ
+ANSWER_PREFIXES = [
+    "Ответ:",
+    "ответ:",
+    "Ответ пользователя:",
+    "Вопрос пользователя:",
+    "Вопрос:",
+]
+
+
+def strip_prefixes(text: str) -> str:
+    """Убираем мусорные префиксы в начале ответа."""
+    for prefix in ANSWER_PREFIXES:
+        if text.startswith(prefix):
+            text = text[len(prefix):].lstrip()
+    return text
+
+
+def preload_llm():
+    """
+    Загружаем модель в фоне при старте, пока рисуется окно.
+    Запускается в потоке-демоне, а не в пуле Qt: пул при выходе ждёт
+    свои задачи, и закрытое окно висело бы, пока Llama(...) догружается.
+    """
+    try:
+        get_llm()
+    finally:
+        LLM_LOADING.clear()
+
+
+class AISignals(QObject):
+    """
+    Сигналы AIWorker (сам он не QObject и живёт в фоновом потоке).
+    token — очередной кусок текста (ответ печатается по мере генерации),
+    finished — хвост, который нужно дописать в конце (многоточие/ошибка).
+    Объект создаётся в UI-потоке, поэтому слоты окна вызываются там же.
+    """
+    token = pyqtSignal(str)
     finished = pyqtSignal(str)
 
+
+# как часто (сек) отправлять накопленный текст ответа в окно
+EMIT_INTERVAL = 0.05
+
+
+class AIWorker:
+    """
+    Генерация ответа в потоке-демоне.
+    Не в пуле Qt: пул при выходе ждёт свои задачи, а вызов llama.cpp
+    (разбор промпта, загрузка модели) прервать нельзя — закрытое окно
+    висело бы до его конца. Демон-поток просто бросается при выходе.
+    """
     def __init__(self, question: str, fragment: str):
-        super().__init__()
+        self.signals = AISignals()
         self.question = question
         self.fragment = fragment
+        # окно закрыли — дальше не считаем (и новых вызовов llama.cpp не делаем)
+        self.cancelled = False
 
     def run(self):
+        if not AI_BUSY.acquire(blocking=False):
+            self.signals.finished.emit(
+                "ИИ ещё отвечает на предыдущий вопрос. Подождите немного."
+            )
+            return
+        try:
+            self.answer()
+        finally:
+            AI_BUSY.release()
+
+    def answer(self):
+        # пока модель грузится в фоне, ждём здесь, а не на LLM_LOCK:
+        # так закрытие окна (cancelled) не ждёт конца загрузки
+        while LLM_LOADING.is_set():
+            if self.cancelled:
+                return
+            time.sleep(0.1)
+        if self.cancelled:
+            return
+
         engine = get_llm()
+        if self.cancelled:
+            return
         if engine is None:
-            self.finished.emit(
+            self.signals.finished.emit(
                 "Локальный ИИ не настроен.\n\n"
                 "Проверь, что установлен пакет llama-cpp-python\n"
-                "и существует файл models/mistral.gguf рядом с программой."
+                "и в папке models рядом с программой лежит модель\n"
+                "(mistral-q4_k_m.gguf или mistral.gguf)."
             )
             return
 
-        # ПРОМПТ БЕЗ ТЕГОВ <ОТВЕТ>/<ВОПРОС>
-        prompt = f"""
-Ты юридический помощник по законодательству РФ.
-Отвечай простым, понятным языком, но опирайся только на реальные законы РФ.
-Если нет точной информации, честно напиши, что данных недостаточно
-и порекомендуй обратиться к официальным источникам
-(Консультант+, pravo.gov.ru и т.п.).
-
-Ниже может быть фрагмент закона (если найден):
-
-Контекст закона:
-{self.fragment}
-
-Вопрос пользователя:
-{self.question}
-
-Теперь дай развёрнутый, но по делу ответ от первого лица.
-Не переписывай вопрос целиком. Не повторяй текст инструкции.
-Ответ:
-"""
-
-        try:
-            result = engine(
-                prompt,
-                max_tokens=480,        # достаточно, чтобы не обрывать мысль
-                temperature=0.25,
-                top_p=0.96,
-                top_k=60,
-                repeat_penalty=1.15,   # сильнее штраф за повтор
-            )
-            raw = result["choices"][0]["text"]
-            text = (raw or "").strip()
-
-            # --- Чистим явный мусор в начале ---
-            for prefix in [
-                "Ответ:",
-                "ответ:",
-                "Ответ пользователя:",
-                "Вопрос пользователя:",
-                "Вопрос:",
-            ]:
-                if text.startswith(prefix):
-                    text = text[len(prefix):].lstrip()
-
-            # защита от пустого
-            if not text:
-                text = "ИИ не смог сформулировать ответ. Попробуйте переформулировать вопрос."
-
-            # Если заканчивается странно — добавим многоточие
-            if text and text[-1] not in ".?!…»\"'":
-                text += "…"
-
-        except Exception as e:
-            text = f"Ошибка работы ИИ: {e}"
+        prompt = PROMPT_HEAD + PROMPT_TAIL.format(
+            fragment=self.fragment,
+            question=self.question,
+        )
 
-        self.finished.emit(text)
+        raw = ""
+        cut = None   # сколько символов мусора отрезано в начале
+        buf = ""     # ещё не отправленные в окно куски
+        last_emit = time.monotonic()
+        with LLM_LOCK:
+            try:
+                stream = engine(
+                    prompt,
+                    max_tokens=480,        # достаточно, чтобы не обрывать мысль
+                    temperature=0.25,
+                    top_p=0.96,
+                    top_k=60,
+                    repeat_penalty=1.15,   # сильнее штраф за повтор
+                    stream=True,
+                )
+                for chunk in stream:
+                    if self.cancelled:
+                        break
+                    piece = chunk["choices"][0]["text"] or ""
+                    raw += piece
+                    if cut is not None:
+                        # копим куски и отдаём пачкой: сигнал между потоками
+                        # и перерисовка окна на каждый токен обходятся дорого
+                        buf += piece
+                        now = time.monotonic()
+                        if "\n" in piece or now - last_emit >= EMIT_INTERVAL:
+                            self.signals.token.emit(buf)
+                            buf = ""
+                            last_emit = now
+                        continue
+
+                    # --- Чистим явный мусор в начале ---
+                    head = strip_prefixes(raw.lstrip())
+                    if not head or any(p.startswith(head) for p in ANSWER_PREFIXES):
+                        continue   # пока непонятно, мусор это или уже ответ
+                    cut = len(raw) - len(head)
+                    self.signals.token.emit(head)   # первое слово — сразу
+                    last_emit = time.monotonic()
+
+                if cut is None:
+                    # до окна ничего не дошло — отдаём всё, что есть, хвостом
+                    tail = strip_prefixes(raw.strip())
+                    # защита от пустого
+                    if not tail:
+                        tail = "ИИ не смог сформулировать ответ. Попробуйте переформулировать вопрос."
+                    text = tail
+                else:
+                    tail = ""
+                    text = raw[cut:].rstrip()
+
+                # Если заканчивается странно — добавим многоточие
+                if text and text[-1] not in ".?!…»\"'":
+                    tail += "…"
+
+            except Exception as e:
+                tail = ("\n" if cut is not None else "") + f"Ошибка работы ИИ: {e}"
+
+        self.signals.finished.emit(buf + tail)
 
 
 # ========= Локальные законы =========
@@ -147,66 +366,225 @@ LAWS_FILES = [
 ]
 
 
-def load_law(filename: str) -> str:
+def load_law(filename: str) -> mmap.mmap | None:
+    """
+    Файл закона, отображённый в память (только чтение).
+    Целиком в str не декодируем — ОС подгружает страницы сама,
+    а декодируются лишь найденные фрагменты.
+    """
     path = os.path.join(BASE_DIR, "laws", filename)
     try:
-        with open(path, "r", encoding="utf-8", errors="ignore") as f:
-            return f.read()
+        with open(path, "rb") as f:
+            return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
     except Exception:
-        return ""
+        # нет файла или он пустой (пустой файл в память не отобразить)
+        return None
+
+
+def load_laws() -> dict[str, mmap.mmap]:
+    """Открываем законы один раз при старте: имя файла -> mmap."""
+    laws = {}
+    for f in LAWS_FILES:
+        mm = load_law(f)
+        if mm is not None:
+            laws[f] = mm
+    return laws
+
+
+def decode_law(raw) -> str:
+    """
+    Текст закона целиком (только при старте, для буфера поиска).
+    Обычно файл — чистый UTF-8, и строгий декодер самый быстрый;
+    битые байты — через surrogateescape: после lower() они кодируются
+    обратно как были, и позиции не сдвигаются.
+    """
+    try:
+        return str(raw, "utf-8")
+    except UnicodeDecodeError:
+        return str(raw, "utf-8", "surrogateescape")
+
+
+def lower_same_length(text: str) -> str:
+    """
+    lower(), который не меняет длину в UTF-8.
+    Редкие символы (знак Кельвина, знак Ома, İ, ẞ…) в нижнем регистре
+    занимают другое число байт — их оставляем как есть, остальное понижаем.
+    """
+    odd = [
+        ch for ch in set(text)
+        if len(ch.lower().encode("utf-8", "surrogateescape"))
+        != len(ch.encode("utf-8", "surrogateescape"))
+    ]
+    if not odd:
+        return text.lower()
+    parts = re.split("([" + re.escape("".join(odd)) + "])", text)
+    # после split с группой чётные куски — обычный текст, нечётные — odd
+    return "".join(
+        part if i % 2 else part.lower() for i, part in enumerate(parts)
+    )
+
+
+# заголовок статьи в начале строки: "Статья 158." (можно с BOM/отступом)
+ARTICLE_RE = re.compile(
+    "(?m)^(?:\ufeff)?[ \t]*статья(?:\\s|\u00a0)+(\\d+)".encode("utf-8")
+)
 
 
+class LawBase:
+    """
+    Законы в памяти.
+    Все тексты в нижнем регистре (UTF-8 байты) склеены в один буфер blob,
+    поэтому поиск фразы сразу по всем законам — один проход bytes.find.
+    Позиции в blob совпадают с позициями в исходных файлах: для кириллицы
+    и латиницы нижний регистр в UTF-8 занимает столько же байт, а файлы
+    с редкими символами, у которых это не так, понижаются через
+    lower_same_length.
+    """
+    # разделитель файлов: \x00 в запросе не бывает, а после \n
+    # начало следующего файла для ARTICLE_RE — начало строки
+    SEP = b"\x00\n"
+
+    def __init__(self, laws: dict[str, mmap.mmap]):
+        self.texts = laws
+        self.names = list(laws)
+        self.starts = []   # где в blob начинается каждый файл
+        self.ends = []
+        # Буфер собираем по файлу за раз: декодируем прямо из mmap (без копии
+        # bytes) и сразу дописываем — в памяти не висят нижние копии всех
+        # файлов одновременно с итоговым буфером.
+        self.blob = bytearray()
+        for f in self.names:
+            text = decode_law(laws[f])
+            low = text.lower().encode("utf-8", "surrogateescape")
+            if len(low) != len(laws[f]):
+                # иначе все позиции после такого символа уедут
+                logging.warning(
+                    "%s: lower() меняет длину текста, "
+                    "понижаем регистр посимвольно", f
+                )
+                low = lower_same_length(text).encode("utf-8", "surrogateescape")
+            del text
+            self.starts.append(len(self.blob))
+            self.blob += low
+            self.ends.append(len(self.blob))
+            self.blob += self.SEP
+
+        # (файл, номер статьи) -> позиция заголовка; первая встреча — главная
+        self.articles = {}
+        for f, start, end in zip(self.names, self.starts, self.ends):
+            for m in ARTICLE_RE.finditer(self.blob, start, end):
+                self.articles.setdefault((f, m.group(1).decode()), m.start() - start)
+
+    def __bool__(self):
+        return bool(self.names)
+
+    def find(self, q: str, fname: str | None = None) -> tuple[str | None, int]:
+        """
+        Ищем q (уже в нижнем регистре) во всех законах или только в fname.
+        Возвращаем (файл, байтовая позиция в нём) или (None, -1).
+        """
+        qb = q.encode("utf-8")
+        if fname is None:
+            idx = self.blob.find(qb)
+        elif fname in self.texts:
+            i = self.names.index(fname)
+            idx = self.blob.find(qb, self.starts[i], self.ends[i])
+        else:
+            idx = -1
+        if idx == -1:
+            return None, -1
+        i = bisect_right(self.starts, idx) - 1
+        return self.names[i], idx - self.starts[i]
+
+    def article(self, fname: str, num: str) -> int:
+        """Позиция "статья num" в fname или -1."""
+        idx = self.articles.get((fname, num))
+        if idx is not None:
+            return idx
+        # заголовок не в начале строки (или его нет в индексе) —
+        # ищем как раньше, простым поиском по файлу
+        f, idx = self.find(f"статья {num}", fname)
+        return idx
+
+    def fragment(self, fname: str, idx: int) -> str:
+        """
+        80 символов до найденного места и 900 после (символ — до 4 байт).
+        Позиции — по сырым байтам mmap, а в сам фрагмент переводы строк
+        Windows (\\r\\n) попадают как \\n, как при чтении в текстовом режиме:
+        лишний \\r — лишний токен в промпте на каждую строку.
+        """
+        mm = self.texts[fname]
+        before = mm[max(0, idx - 80 * 4): idx].decode("utf-8", errors="ignore")
+        after = mm[idx: idx + 900 * 4].decode("utf-8", errors="ignore")
+        before = before.replace("\r\n", "\n")
+        after = after.replace("\r\n", "\n")
+        return before[-80:] + after[:900]
+
+
+# первое число в запросе — номер статьи
+NUM_RE = re.compile(r"\d+")
+
+
+# ключевые слова запроса -> файл закона (порядок = приоритет)
+FILE_KEYWORDS = {
+    "uk_rf.txt": r"уголов|\bук\b",
+    "koap_rf.txt": r"коап|административ",
+    "gk_rf.txt": r"\bгк\b|граждан",
+    "constitution_rf.txt": r"конституц",
+    "law_police.txt": r"полици",
+    "law_consumer.txt": r"потребител",
+}
+FILE_NAMES = list(FILE_KEYWORDS)
+# одна альтернатива на все слова — запрос просматривается один раз,
+# номер группы g<i> показывает, чей это файл
+FILE_RE = re.compile("|".join(
+    f"(?P<g{i}>{pat})" for i, pat in enumerate(FILE_KEYWORDS.values())
+))
+
+
+@lru_cache(maxsize=256)
 def detect_file(q: str) -> str | None:
-    q = q.lower()
-    if "уголов" in q or "ук" in q:
-        return "uk_rf.txt"
-    if "коап" in q or "административ" in q:
-        return "koap_rf.txt"
-    if "гк" in q or "граждан" in q:
-        return "gk_rf.txt"
-    if "конституц" in q:
-        return "constitution_rf.txt"
-    if "полици" in q:
-        return "law_police.txt"
-    if "потребител" in q:
-        return "law_consumer.txt"
-    return None
+    best = None
+    for m in FILE_RE.finditer(q.lower()):
+        i = int(m.lastgroup[1:])
+        if best is None or i < best:
+            best = i
+            if best == 0:
+                break
+    return FILE_NAMES[best] if best is not None else None
 
 
-def find_article(query: str, laws_ok: bool):
+def find_article(query: str, laws: LawBase):
     """Пытаемся найти статью/фрагмент в законах."""
-    if not laws_ok:
+    if not laws:
         return None, None
 
     q = query.lower()
-    nums = re.findall(r"\d+", q)
-    num = nums[0] if nums else None
+    m = NUM_RE.search(q)
+    num = m.group() if m else None
 
     codex = detect_file(q)
 
     if num and codex:
-        full = load_law(codex)
-        low = full.lower()
-        pattern = f"статья {num}"
-        idx = low.find(pattern)
+        idx = laws.article(codex, num)
         if idx != -1:
-            return codex, full[max(0, idx - 80): idx + 900]
+            return codex, laws.fragment(codex, idx)
 
-    for f in LAWS_FILES:
-        full = load_law(f)
-        if not full:
-            continue
-        low = full.lower()
-        idx = low.find(q)
-        if idx != -1:
-            return f, full[max(0, idx - 80): idx + 900]
+    f, idx = laws.find(q)
+    if f:
+        return f, laws.fragment(f, idx)
 
     return None, None
 
 
 # ========= UI-элементы =========
 class Glass(QWidget):
-    """Стеклянная панель с мягкой подсветкой."""
+    """
+    Стеклянная панель.
+    Без QGraphicsDropShadowEffect: эффект заставлял Qt заново размывать
+    всю панель на процессоре при каждой перерисовке (прокрутка, набор текста),
+    контур держит светлая рамка.
+    """
     def __init__(self):
         super().__init__()
         self.setStyleSheet("""
@@ -216,11 +594,6 @@ class Glass(QWidget):
             border:1px solid rgba(255,255,255,0.25);
         }
         """)
-        shadow = QGraphicsDropShadowEffect()
-        shadow.setBlurRadius(40)
-        shadow.setOffset(0, 6)
-        shadow.setColor(QColor(255, 255, 255, 60))
-        self.setGraphicsEffect(shadow)
 
 
 class Btn(QPushButton):
@@ -244,8 +617,23 @@ class Btn(QPushButton):
         """)
 
 
+# ~15 кадров в секунду: для медленного перелива радуги глазу хватает,
+# а процессор не перерисовывает виджеты 25 раз в секунду впустую
+FRAME_MS = 66
+
+
 class RainbowAvatar(QWidget):
     """Круглая аватарка с радужным ободком."""
+    RING_STOPS = [
+        (0.0, QColor(255, 90, 90)),
+        (0.16, QColor(255, 160, 90)),
+        (0.33, QColor(255, 255, 120)),
+        (0.5, QColor(120, 255, 160)),
+        (0.66, QColor(90, 190, 255)),
+        (0.83, QColor(200, 130, 255)),
+        (1.0, QColor(255, 90, 140)),
+    ]
+
     def __init__(self, path: str, size: int = 80, parent=None):
         super().__init__(parent)
         self.size_val = size
@@ -257,14 +645,37 @@ class RainbowAvatar(QWidget):
             self.src = QPixmap(self.size_val, self.size_val)
             self.src.fill(Qt.GlobalColor.darkGray)
 
+        # размер аватарки внутри ободка не меняется — масштабируем один раз
+        inner_r = self.size_val / 2.0 + 4.0 - 6.0
+        self.img = self.src.scaled(
+            int(inner_r * 2),
+            int(inner_r * 2),
+            Qt.AspectRatioMode.KeepAspectRatioByExpanding,
+            Qt.TransformationMode.SmoothTransformation
+        )
+
+        # градиент собираем один раз, в кадре меняется только угол
+        self.grad = QConicalGradient()
+        for pos, color in self.RING_STOPS:
+            self.grad.setColorAt(pos, color)
+
         self.timer = QTimer(self)
         self.timer.timeout.connect(self._tick)
-        self.timer.start(40)
+        self.timer.start(FRAME_MS)
 
     def _tick(self):
-        self.phase = (self.phase + 3) % 360
+        self.phase = (self.phase + 5) % 360
         self.update()
 
+    # скрытый виджет (свёрнутое окно) не анимируем
+    def showEvent(self, event):
+        self.timer.start(FRAME_MS)
+        super().showEvent(event)
+
+    def hideEvent(self, event):
+        self.timer.stop()
+        super().hideEvent(event)
+
     def paintEvent(self, event):
         s = self.size_val
         w = float(self.width())
@@ -282,16 +693,10 @@ class RainbowAvatar(QWidget):
         p.drawEllipse(center, radius, radius)
 
         # радужный ободок
-        grad = QConicalGradient(center, float(self.phase))
-        grad.setColorAt(0.0, QColor(255, 90, 90))
-        grad.setColorAt(0.16, QColor(255, 160, 90))
-        grad.setColorAt(0.33, QColor(255, 255, 120))
-        grad.setColorAt(0.5, QColor(120, 255, 160))
-        grad.setColorAt(0.66, QColor(90, 190, 255))
-        grad.setColorAt(0.83, QColor(200, 130, 255))
-        grad.setColorAt(1.0, QColor(255, 90, 140))
-
-        pen = QPen(QBrush(grad), 5)
+        self.grad.setCenter(center)
+        self.grad.setAngle(float(self.phase))
+
+        pen = QPen(QBrush(self.grad), 5)
         p.setPen(pen)
         p.setBrush(Qt.BrushStyle.NoBrush)
         p.drawEllipse(center, radius - 2, radius - 2)
@@ -302,15 +707,9 @@ class RainbowAvatar(QWidget):
         circle.addEllipse(center, inner_r, inner_r)
         p.setClipPath(circle)
 
-        img = self.src.scaled(
-            int(inner_r * 2),
-            int(inner_r * 2),
-            Qt.AspectRatioMode.KeepAspectRatioByExpanding,
-            Qt.TransformationMode.SmoothTransformation
-        )
         p.drawPixmap(int(center.x() - inner_r),
                      int(center.y() - inner_r),
-                     img)
+                     self.img)
 
         # лёгкое затемнение внутри круга
         p.fillRect(self.rect(), QColor(0, 0, 0, 90))
@@ -327,6 +726,14 @@ class RainbowLineEdit(QLineEdit):
     - placeholder почти белый
     - фиолетовое выделение + белый glow по контуру
     """
+    RING_STOPS = [
+        (0.0, QColor(120, 255, 200, 150)),
+        (0.25, QColor(120, 180, 255, 150)),
+        (0.5, QColor(200, 160, 255, 150)),
+        (0.75, QColor(255, 200, 140, 150)),
+        (1.0, QColor(120, 255, 200, 150)),
+    ]
+
     def __init__(self, parent=None):
         super().__init__(parent)
         self.phase = 0.0
@@ -349,37 +756,82 @@ class RainbowLineEdit(QLineEdit):
         }
         """)
 
+        self.grad = QConicalGradient()
+        for pos, color in self.RING_STOPS:
+            self.grad.setColorAt(pos, color)
+
+        # тёмная подложка не меняется — рисуем её один раз на размер поля
+        self.bg = None
+
+        # радуга крутится, только пока в поле печатают или что-то выделено
         self.timer = QTimer(self)
         self.timer.timeout.connect(self._tick)
-        self.timer.start(40)
+        self.selectionChanged.connect(self._sync_timer)
 
     def _tick(self):
-        self.phase = (self.phase + 2) % 360
+        self.phase = (self.phase + 3) % 360
         self.update()
 
+    def _sync_timer(self):
+        active = self.isVisible() and (self.hasFocus() or self.hasSelectedText())
+        if active and not self.timer.isActive():
+            self.timer.start(FRAME_MS)
+        elif not active:
+            self.timer.stop()
+
+    def showEvent(self, event):
+        super().showEvent(event)
+        self._sync_timer()
+
+    def hideEvent(self, event):
+        super().hideEvent(event)
+        self._sync_timer()
+
+    def focusInEvent(self, event):
+        super().focusInEvent(event)
+        self._sync_timer()
+
+    def focusOutEvent(self, event):
+        super().focusOutEvent(event)
+        self._sync_timer()
+
+    def resizeEvent(self, event):
+        self.bg = None
+        super().resizeEvent(event)
+
+    def _render_bg(self, rect) -> QPixmap:
+        dpr = self.devicePixelRatioF()
+        bg = QPixmap(int(self.width() * dpr), int(self.height() * dpr))
+        bg.setDevicePixelRatio(dpr)
+        bg.fill(Qt.GlobalColor.transparent)
+
+        p = QPainter(bg)
+        p.setRenderHint(QPainter.RenderHint.Antialiasing)
+        inner = QRectF(rect).adjusted(1, 1, -1, -1)
+        p.setPen(Qt.PenStyle.NoPen)
+        p.setBrush(QColor(8, 8, 12, 240))
+        p.drawRoundedRect(inner, self.radius - 1, self.radius - 1)
+        p.end()
+        return bg
+
     def paintEvent(self, event):
         # сначала фон и рамка
+        rect = self.rect().adjusted(2, 2, -2, -2)
+        if self.bg is None:
+            self.bg = self._render_bg(rect)
+
         p = QPainter(self)
         p.setRenderHint(QPainter.RenderHint.Antialiasing)
+        p.drawPixmap(0, 0, self.bg)
 
-        rect = self.rect().adjusted(2, 2, -2, -2)
         center_qpoint = rect.center()
         center = QPointF(float(center_qpoint.x()),
                          float(center_qpoint.y()))
 
-        grad = QConicalGradient(center, float(self.phase))
-        grad.setColorAt(0.0, QColor(120, 255, 200, 150))
-        grad.setColorAt(0.25, QColor(120, 180, 255, 150))
-        grad.setColorAt(0.5, QColor(200, 160, 255, 150))
-        grad.setColorAt(0.75, QColor(255, 200, 140, 150))
-        grad.setColorAt(1.0, QColor(120, 255, 200, 150))
+        self.grad.setCenter(center)
+        self.grad.setAngle(float(self.phase))
 
-        inner = QRectF(rect).adjusted(1, 1, -1, -1)
-        p.setPen(Qt.PenStyle.NoPen)
-        p.setBrush(QColor(8, 8, 12, 240))
-        p.drawRoundedRect(inner, self.radius - 1, self.radius - 1)
-
-        pen = QPen(QBrush(grad), 2.0)
+        pen = QPen(QBrush(self.grad), 2.0)
         p.setPen(pen)
         p.setBrush(Qt.BrushStyle.NoBrush)
         p.drawRoundedRect(QRectF(rect), self.radius, self.radius)
@@ -415,6 +867,8 @@ class Main(QMainWindow):
         self.laws_ok = os.path.exists(laws_dir) and any(
             os.path.exists(os.path.join(laws_dir, f)) for f in LAWS_FILES
         )
+        # законы открываем один раз, а не на каждый запрос
+        self.laws = LawBase(load_laws())
 
         root_widget = QWidget()
         self.setCentralWidget(root_widget)
@@ -459,8 +913,12 @@ class Main(QMainWindow):
         """)
         c.addWidget(title)
 
-        self.out = QTextEdit()
+        # QPlainTextEdit: текст без разметки, дописывание в конец дешёвое,
+        # а старые строки отбрасываются, чтобы длинная сессия не тормозила
+        self.out = QPlainTextEdit()
         self.out.setReadOnly(True)
+        self.out.setMaximumBlockCount(2000)
+        self.out_cursor = QTextCursor(self.out.document())
         self.out.setStyleSheet("""
             color:white;
             background: transparent;
@@ -519,8 +977,14 @@ class Main(QMainWindow):
         layout.addWidget(right, 2)
 
         self.is_full = False
+        self.worker = None
         self.home()
 
+        # модель грузится несколько секунд — начинаем сразу, а не на первом вопросе
+        if HAS_LLAMA and MODEL_PATH is not None:
+            LLM_LOADING.set()
+            Thread(target=preload_llm, daemon=True).start()
+
     # ===== Логика =====
     def toggle_full(self):
         if self.is_full:
@@ -546,40 +1010,62 @@ class Main(QMainWindow):
                 "\nДополнительно: пока не найдены файлы законов в папке 'laws'.\n"
                 "Папка должна находиться рядом с программой (app.py или .exe)."
             )
-        self.out.setText(base)
+        self.out.setPlainText(base)
 
     def do_search(self):
         q = self.input.text().strip()
         if not q:
             return
 
-        fname, frag = find_article(q, self.laws_ok)
+        fname, frag = find_article(q, self.laws)
         if not fname:
             if not self.laws_ok:
-                self.out.append("\nПоиск: не найдены файлы законов в папке 'laws'.\n")
+                self.out.appendPlainText("\nПоиск: не найдены файлы законов в папке 'laws'.\n")
             else:
-                self.out.append("\nНичего не найдено в загруженных txt-файлах.\n")
+                self.out.appendPlainText("\nНичего не найдено в загруженных txt-файлах.\n")
         else:
-            self.out.append(f"\nНайдено в {fname}:\n{frag}\n")
+            self.out.appendPlainText(f"\nНайдено в {fname}:\n{frag}\n")
 
     def ask_ai(self):
         q = self.input.text().strip()
         if not q:
             return
+        # llama.cpp не умеет несколько запросов сразу — ждём текущий ответ
+        if not self.btn_ai.isEnabled():
+            return
 
-        fname, frag = find_article(q, self.laws_ok)
-        frag = frag or ""
-
-        self.out.append("\nИИ думает...\n")
-
-        worker = AIWorker(q, frag)
-        worker.finished.connect(self.ai_done)
-
-        thread = Thread(target=worker.run, daemon=True)
-        thread.start()
-
-    def ai_done(self, text: str):
-        self.out.append("Ответ ИИ:\n" + text + "\n")
+        # без упоминания кодекса и номера статьи фрагмент почти никогда
+        # не находится — не гоняем поиск по всем законам зря
+        frag = ""
+        if detect_file(q) or NUM_RE.search(q):
+            fname, frag = find_article(q, self.laws)
+            frag = frag or ""
+
+        self.out.appendPlainText("\nИИ думает...\n")
+        self.out.appendPlainText("Ответ ИИ:\n")
+
+        self.btn_ai.setEnabled(False)
+
+        self.worker = AIWorker(q, frag)
+        self.worker.signals.token.connect(self.ai_token)
+        self.worker.signals.finished.connect(self.ai_done)
+        Thread(target=self.worker.run, daemon=True).start()
+
+    def ai_token(self, text: str):
+        self.out_cursor.movePosition(QTextCursor.MoveOperation.End)
+        self.out_cursor.insertText(text)
+        bar = self.out.verticalScrollBar()
+        bar.setValue(bar.maximum())
+
+    def ai_done(self, tail: str):
+        self.ai_token(tail + "\n")
+        self.btn_ai.setEnabled(True)
+        self.worker = None
+
+    def closeEvent(self, event):
+        if self.worker is not None:
+            self.worker.cancelled = True
+        super().closeEvent(event)
 
 
 def main():